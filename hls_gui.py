@@ -7,7 +7,8 @@ import queue
 import shutil
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import Future, CancelledError, as_completed
 import requests
 from tkinterdnd2 import DND_FILES, TkinterDnD
 
@@ -17,6 +18,10 @@ M3U8_DIR = "m3u8"
 DEFAULT_SEGMENT_SECONDS = 3
 DEFAULT_UPLOAD_THREADS = 2
 DEFAULT_MAX_RETRIES = 3
+DEFAULT_SCRATCH_BUDGET_GB = 20           # 同时在途的切片临时空间上限，0 表示只检查磁盘剩余空间；单个超出上限的视频会在无其他在途任务时单独处理
+SCRATCH_RESERVE_BYTES = 512 * 1024 * 1024  # 切片时磁盘至少保留的剩余空间
+SCRATCH_POLL_SECONDS = 1
+FAILED_RETENTION_DAYS = 7                # 上传失败保留的切片目录超过天数后自动清理，0 表示不清理
 
 UPLOAD_URL = (
     "https://img1.freeforever.club/upload"
@@ -29,6 +34,22 @@ UPLOAD_URL = (
 AUTHCODE = "97"
 VIDEO_EXTS = (".mp4", ".mkv", ".ts")
 
+# 任务优先级：数值越小越先切片，上传线程空闲时也优先分给高优先级视频的分片
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_LABELS = {PRIORITY_URGENT: "🔥 紧急", PRIORITY_NORMAL: "普通", PRIORITY_BACKGROUND: "后台"}
+
+# 同优先级内的切片顺序
+POLICY_FIFO = "列表顺序"
+POLICY_SMALLEST = "小文件优先"
+POLICY_LARGEST = "大文件优先"
+SCHEDULE_POLICIES = (POLICY_FIFO, POLICY_SMALLEST, POLICY_LARGEST)
+
+# 单个任务的控制状态 (未出现在 job_state 中即正常调度)
+JOB_PAUSED = "paused"
+JOB_CANCELLED = "cancelled"
+
 # ================= 视觉配色 =================
 COLOR_BG_MAIN = "#F2F6FC"
 COLOR_CARD_BG = "#FFFFFF"
@@ -68,6 +89,16 @@ def upload_file(file_path):
     src = data[0]["src"]
     return "https://img1.freeforever.club" + src
 
+def dir_size(path):
+    total = 0
+    for rootdir, _, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                total += os.path.getsize(os.path.join(rootdir, fn))
+            except OSError:
+                pass
+    return total
+
 def ensure_m3u8_dir():
     os.makedirs(M3U8_DIR, exist_ok=True)
 
@@ -85,6 +116,15 @@ class VideoUploaderGUI:
         self._setup_styles()
 
         self.files = []
+        self.job_priority = {}
+        self.job_sizes = {}
+        self.started_files = set()
+        self.active_jobs = set()   # 有线程正在切片/上传/排空的任务，收尾前不会被重新调度
+        self.schedule_policy = POLICY_FIFO
+        self.job_state = {}
+        self.job_procs = {}
+        self.job_dirs = {}   # 已切片完成的视频 -> 切片目录，暂停后继续时跳过切片
+        self.job_urls = {}   # 已上传成功的分片地址，暂停后继续时只传剩余分片
         self.log_q = queue.Queue()
         self.is_running = False
         self.stop_requested = False
@@ -92,9 +132,17 @@ class VideoUploaderGUI:
         self.data_lock = threading.Lock()
         self.total_task_bytes = 0
         self.finished_file_bytes = 0
-        self.current_processing_bytes = 0
+        self.job_progress_bytes = {}
         
         self.failed_summary = {} 
+        self.space_skipped = []
+        self.scratch_peak_bytes = 0
+        self.active_dirs = set()
+
+        self.seg_cond = threading.Condition()
+        self.seg_pending = {}
+        self.upload_workers = []
+        self.upload_closed = False
 
         # === 主布局 ===
         top_container = tk.Frame(root, bg=COLOR_BG_MAIN)
@@ -121,7 +169,7 @@ class VideoUploaderGUI:
         table_border = tk.Frame(left_card, bg=COLOR_BORDER_BLUE, padx=1, pady=1)
         table_border.pack(fill="both", expand=True, padx=15, pady=(0, 15))
 
-        columns = ("name", "path", "status")
+        columns = ("name", "path", "priority", "status")
         self.tree = ttk.Treeview(table_border, columns=columns, show="headings", 
                                  selectmode="extended", style="Custom.Treeview")
         
@@ -132,9 +180,11 @@ class VideoUploaderGUI:
 
         self.tree.heading("name", text="文件名")
         self.tree.heading("path", text="完整路径")
+        self.tree.heading("priority", text="优先级")
         self.tree.heading("status", text="当前状态")
         self.tree.column("name", width=200, anchor="w")
-        self.tree.column("path", width=350, anchor="w")
+        self.tree.column("path", width=280, anchor="w")
+        self.tree.column("priority", width=70, anchor="center")
         self.tree.column("status", width=120, anchor="center")
 
         self.tree.tag_configure("evenrow", background="#f2f8ff")
@@ -144,9 +194,23 @@ class VideoUploaderGUI:
         self.tree.dnd_bind("<<Drop>>", self.on_drop)
         
         self.menu = tk.Menu(root, tearoff=0, bg="white", fg="black")
+        for level, label in PRIORITY_LABELS.items():
+            self.menu.add_command(label=f"设为{label}", command=lambda lv=level: self.set_selected_priority(lv))
+        self.menu.add_separator()
+        self.menu.add_command(label="⏸ 暂停", command=self.pause_selected)
+        self.menu.add_command(label="▶ 继续", command=self.resume_selected)
+        self.menu.add_command(label="✖ 取消任务", command=self.cancel_selected)
+        self.menu.add_separator()
         self.menu.add_command(label="删除选中", command=self.delete_selected)
         self.tree.bind("<Button-3>", self.show_context_menu)
 
+        # 拖动行调整顺序
+        self._drag_iid = None
+        self._drag_moved = False
+        self.tree.bind("<ButtonPress-1>", self._on_drag_start, add="+")
+        self.tree.bind("<B1-Motion>", self._on_drag_motion, add="+")
+        self.tree.bind("<ButtonRelease-1>", self._on_drag_release, add="+")
+
         footer_frame = tk.Frame(left_card, bg="#FAFAFA", height=45)
         footer_frame.pack(fill="x", side="bottom")
         
@@ -197,6 +261,18 @@ class VideoUploaderGUI:
         self.retry_entry.insert(0, str(DEFAULT_MAX_RETRIES))
         self.retry_entry.grid(row=2, column=1, sticky="e", pady=8)
 
+        tk.Label(form_frame, text="临时空间上限 (GB):", bg=COLOR_CARD_BG, fg="black", font=("Microsoft YaHei", 10)).grid(row=3, column=0, sticky="w", pady=8)
+        self.budget_entry = tk.Entry(form_frame, width=8, **entry_conf)
+        self.budget_entry.insert(0, str(DEFAULT_SCRATCH_BUDGET_GB))
+        self.budget_entry.grid(row=3, column=1, sticky="e", pady=8)
+
+        tk.Label(form_frame, text="调度策略:", bg=COLOR_CARD_BG, fg="black", font=("Microsoft YaHei", 10)).grid(row=4, column=0, sticky="w", pady=8)
+        self.policy_box = ttk.Combobox(form_frame, width=10, values=SCHEDULE_POLICIES, state="readonly",
+                                       font=("Microsoft YaHei", 9), justify="center")
+        self.policy_box.set(POLICY_FIFO)
+        self.policy_box.grid(row=4, column=1, sticky="e", pady=8)
+        self.policy_box.bind("<<ComboboxSelected>>", self._on_policy_change)
+
         tk.Frame(right_card, bg=COLOR_BORDER_BLUE, height=1).pack(fill="x", padx=20, pady=20)
 
         self.start_btn = tk.Button(right_card, text="开始处理", bg=COLOR_BTN_START, fg="white",
@@ -336,12 +412,15 @@ class VideoUploaderGUI:
                 if os.path.isfile(p) and p.lower().endswith(VIDEO_EXTS):
                     if p not in self.files:
                         self.files.append(p)
+                        self.job_priority[p] = PRIORITY_NORMAL
                         added_count += 1
                         new_items.append(p)
+                        fsize = 0
                         try:
                             fsize = os.path.getsize(p)
                             added_size += fsize
                         except: pass
+                        self.job_sizes[p] = fsize
                         
             if added_count > 0:
                 self.total_task_bytes += added_size
@@ -352,7 +431,7 @@ class VideoUploaderGUI:
                 for i, fp in enumerate(new_items):
                     idx = current_count + i
                     tag = "evenrow" if idx % 2 == 0 else "oddrow"
-                    self.tree.insert("", "end", values=(os.path.basename(fp), fp, "等待中"), tags=(tag,))
+                    self.tree.insert("", "end", values=(os.path.basename(fp), fp, PRIORITY_LABELS[PRIORITY_NORMAL], "等待中"), tags=(tag,))
 
                 self.log(f"添加 {added_count} 个文件 (共 {added_size/1024/1024:.1f} MB)")
 
@@ -361,18 +440,140 @@ class VideoUploaderGUI:
         if row_id:
             if row_id not in self.tree.selection():
                 self.tree.selection_set(row_id)
-            
-            if self.is_running:
-                return
 
-            vals = self.tree.item(row_id, "values")
-            status = vals[2]
-            
-            if "⚡" in status or "☁" in status or "✅" in status:
-                return
+            # 运行中或处理中/已完成的行不允许删除
+            status = self.tree.set(row_id, "status")
+            can_delete = not self.is_running and not ("⚡" in status or "☁" in status or "✅" in status)
+            self.menu.entryconfig("删除选中", state="normal" if can_delete else "disabled")
             
             self.menu.post(event.x_root, event.y_root)
 
+    def set_selected_priority(self, level):
+        selected = self.tree.selection()
+        if not selected:
+            return
+        with self.data_lock:
+            for iid in selected:
+                path = self.tree.set(iid, "path")
+                self.job_priority[path] = level
+                self.tree.set(iid, "priority", PRIORITY_LABELS[level])
+        self.log(f"已将 {len(selected)} 个任务设为 {PRIORITY_LABELS[level]}")
+
+    def _selected_paths(self, skip_marks=()):
+        paths = []
+        for iid in self.tree.selection():
+            status = self.tree.set(iid, "status")
+            if any(mark in status for mark in skip_marks):
+                continue
+            paths.append(self.tree.set(iid, "path"))
+        return paths
+
+    def pause_selected(self):
+        paused = 0
+        for fp in self._selected_paths(skip_marks=("✅", "⏸", "🚫", "⛔")):
+            with self.data_lock:
+                if fp in self.job_state:
+                    continue
+                # 运行中只能暂停还在处理或待处理的任务，本轮已结束的 (部分失败、空间不足) 不再调度
+                if self.is_running and fp in self.started_files and fp not in self.active_jobs:
+                    continue
+                self.job_state[fp] = JOB_PAUSED
+            self._interrupt_job(fp)
+            self._update_status(fp, "⏸ 已暂停")
+            paused += 1
+        if paused:
+            self.log(f"已暂停 {paused} 个任务，已切片/已上传的部分会保留", "WARN")
+
+    def resume_selected(self):
+        resumed = 0
+        for fp in self._selected_paths():
+            with self.data_lock:
+                state = self.job_state.get(fp)
+                if state not in (JOB_PAUSED, JOB_CANCELLED):
+                    continue
+                # 只清除暂停/取消标记；原线程还在收尾时由它 _park_job 后再放回队列，避免同一任务被两个线程处理
+                del self.job_state[fp]
+                owned = fp in self.active_jobs
+                if state == JOB_CANCELLED and not owned and fp in self.started_files:
+                    # 本轮已取消的任务计入过进度，重新排队时扣回
+                    self.started_files.discard(fp)
+                    self.finished_file_bytes -= self.job_sizes.get(fp, 0)
+                    self._calculate_and_update_global_progress()
+            resumed += 1
+            if not owned:
+                self._update_status(fp, "等待继续" if fp in self.job_dirs else "等待中")
+        if resumed:
+            self.log(f"已继续 {resumed} 个任务" + ("" if self.is_running else "，点击开始处理后执行"))
+
+    def cancel_selected(self):
+        paths = self._selected_paths(skip_marks=("✅", "🚫", "⛔"))
+        for fp in paths:
+            with self.data_lock:
+                self.job_state[fp] = JOB_CANCELLED
+                # 未开始或已暂停挂起的任务没有线程负责收尾，这里直接清理并计入进度
+                idle = not self.is_running or fp not in self.active_jobs
+                # 本轮已经结束过的任务 (如部分分片失败) 不能重复计入进度
+                count_progress = self.is_running and fp not in self.started_files
+                if idle:
+                    self.started_files.add(fp)
+            self._interrupt_job(fp)
+            if idle:
+                self._discard_job_files(fp)
+                self._update_status(fp, "🚫 已取消")
+                if count_progress:
+                    self._finish_job(fp, self.job_sizes.get(fp, 0))
+        if paths:
+            self.log(f"已取消 {len(paths)} 个任务", "WARN")
+
+    def _interrupt_job(self, fp):
+        """立即终止该任务的 ffmpeg，并撤回尚未开始上传的分片，释放 CPU、磁盘和上传线程"""
+        # 取走登记的进程，切片线程据此判断 ffmpeg 是被中断而不是自己退出的
+        with self.data_lock:
+            proc = self.job_procs.pop(fp, None)
+        if proc and proc.poll() is None:
+            try: proc.terminate()
+            except OSError: pass
+        self._withdraw_segments(fp)
+
+    def _discard_job_files(self, fp):
+        with self.data_lock:
+            video_dir = self.job_dirs.pop(fp, None)
+            self.job_urls.pop(fp, None)
+            self.job_progress_bytes.pop(fp, None)
+        if video_dir:
+            try: shutil.rmtree(video_dir)
+            except: pass
+            self._release_video_dir(video_dir)
+
+    def _on_policy_change(self, event=None):
+        # 工作线程不能直接读取 Tk 控件，这里把选择同步到普通属性
+        self.schedule_policy = self.policy_box.get()
+        self.log(f"调度策略切换为: {self.schedule_policy}")
+
+    def _on_drag_start(self, event):
+        self._drag_iid = self.tree.identify_row(event.y)
+        self._drag_moved = False
+
+    def _on_drag_motion(self, event):
+        if not self._drag_iid:
+            return
+        target = self.tree.identify_row(event.y)
+        if target and target != self._drag_iid:
+            self.tree.move(self._drag_iid, "", self.tree.index(target))
+            self._drag_moved = True
+
+    def _on_drag_release(self, event):
+        if self._drag_iid and self._drag_moved:
+            with self.data_lock:
+                self.files = [self.tree.set(iid, "path") for iid in self.tree.get_children()]
+            self._restripe_rows()
+        self._drag_iid = None
+        self._drag_moved = False
+
+    def _restripe_rows(self):
+        for i, iid in enumerate(self.tree.get_children()):
+            self.tree.item(iid, tags=("evenrow" if i % 2 == 0 else "oddrow",))
+
     def delete_selected(self):
         if self.is_running:
             messagebox.showwarning("警告", "任务正在进行中，禁止删除文件！")
@@ -383,28 +584,33 @@ class VideoUploaderGUI:
             return
 
         to_delete_iids = []
+        deleted_paths = []
         protected_count = 0
         
         with self.data_lock:
             for iid in selected:
-                vals = self.tree.item(iid, "values")
-                status = vals[2]
-                path = vals[1]
+                status = self.tree.set(iid, "status")
+                path = self.tree.set(iid, "path")
                 
                 if "⚡" in status or "☁" in status or "✅" in status:
                     protected_count += 1
                     continue
                 
                 to_delete_iids.append(iid)
+                deleted_paths.append(path)
                 if path in self.files:
-                    try:
-                        fsize = os.path.getsize(path)
-                        self.total_task_bytes -= fsize
-                    except: pass
+                    self.total_task_bytes -= self.job_sizes.pop(path, 0)
+                    self.job_priority.pop(path, None)
+                    self.job_state.pop(path, None)
                     self.files.remove(path)
 
             for iid in to_delete_iids:
                 self.tree.delete(iid)
+            self._restripe_rows()
+
+        # 暂停中的任务可能还保留着切片目录
+        for path in deleted_paths:
+            self._discard_job_files(path)
             
         if protected_count > 0:
             self.log(f"提示：已跳过 {protected_count} 个处理中/已完成的文件", "WARN")
@@ -413,11 +619,16 @@ class VideoUploaderGUI:
         if self.is_running:
             messagebox.showwarning("警告", "任务正在进行中，禁止清空列表！")
             return
+        for fp in list(self.job_dirs):
+            self._discard_job_files(fp)
         with self.data_lock:
             self.files = []
+            self.job_priority = {}
+            self.job_sizes = {}
+            self.job_state = {}
             self.total_task_bytes = 0
             self.finished_file_bytes = 0
-            self.current_processing_bytes = 0
+            self.job_progress_bytes = {}
         self.refresh_table()
         self.progress["value"] = 0
         self.progress_label.config(text="0.00%")
@@ -428,7 +639,8 @@ class VideoUploaderGUI:
             self.tree.delete(item)
         for i, fp in enumerate(self.files):
             tag = "evenrow" if i % 2 == 0 else "oddrow"
-            self.tree.insert("", "end", values=(os.path.basename(fp), fp, "等待中"), tags=(tag,))
+            level = self.job_priority.get(fp, PRIORITY_NORMAL)
+            self.tree.insert("", "end", values=(os.path.basename(fp), fp, PRIORITY_LABELS[level], "等待中"), tags=(tag,))
 
     def exit_app(self):
         if self.is_running:
@@ -444,12 +656,20 @@ class VideoUploaderGUI:
             seg = int(self.seg_entry.get())
             thr = int(self.thr_entry.get())
             retries = int(self.retry_entry.get())
-            if retries <= 0: raise ValueError
+            budget_gb = int(self.budget_entry.get())
+            if retries <= 0 or budget_gb < 0: raise ValueError
         except: 
-            messagebox.showwarning("错误", "参数必须为正整数")
+            messagebox.showwarning("错误", "参数必须为正整数 (临时空间上限可填 0 表示不限)")
             return
+        budget = budget_gb * 1024 * 1024 * 1024
 
         os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+        # 取消只对当次运行有效，新一轮重新排队
+        cancelled = [fp for fp, state in self.job_state.items() if state == JOB_CANCELLED]
+        for fp in cancelled:
+            del self.job_state[fp]
+            self._tree_set(fp, "等待中")
         
         self.is_running = True
         self.stop_requested = False
@@ -457,25 +677,35 @@ class VideoUploaderGUI:
         self.stop_btn.config(state="normal", bg=COLOR_BTN_STOP)
         
         self.finished_file_bytes = 0
-        self.current_processing_bytes = 0
+        self.job_progress_bytes = {}
         self.failed_summary = {} 
+        self.space_skipped = []
+        self.scratch_peak_bytes = 0
+        self.active_dirs = set(self.job_dirs.values())
+        self.started_files = set()
+        self.active_jobs = set()
         self.progress["value"] = 0
         self.progress_label.config(text="0.00%")
         
-        threading.Thread(target=self._process_thread, args=(seg, thr, retries), daemon=True).start()
+        threading.Thread(target=self._process_thread, args=(seg, thr, retries, budget), daemon=True).start()
 
     def stop_process(self):
         if not self.is_running: return
-        if messagebox.askyesno("确认", "确定要停止当前任务吗？\n(正在切片的任务会等待切完，正在上传的任务会立即中断并清理)"):
+        if messagebox.askyesno("确认", "确定要停止当前任务吗？\n(正在切片和上传的任务会立即中断并清理，已暂停的任务保留)"):
             self.stop_requested = True
             self.stop_btn.config(state="disabled", text="停止中...")
             self.log("用户请求停止任务...", "WARN")
+            with self.data_lock:
+                running = list(self.job_procs)
+            for fp in running:
+                self._interrupt_job(fp)
+            self._withdraw_segments()
 
     def _calculate_and_update_global_progress(self):
         if self.total_task_bytes == 0:
             val = 0
         else:
-            total_done = self.finished_file_bytes + self.current_processing_bytes
+            total_done = self.finished_file_bytes + sum(self.job_progress_bytes.values())
             val = (total_done / self.total_task_bytes) * 100
         
         if val > 100: val = 100
@@ -484,46 +714,61 @@ class VideoUploaderGUI:
             self.progress_label.config(text=f"{v:.2f}%")
         ))
 
-    def _process_thread(self, seg, thr, retries):
-        processed_index = 0
+    def _process_thread(self, seg, thr, retries, budget):
+        job_threads = []
+        self._start_upload_workers(thr)
         self.log(f"任务启动，初始总大小: {self.total_task_bytes/1024/1024:.2f} MB")
+        self._purge_stale_slices()
 
         while True:
             if self.stop_requested:
                 break
 
-            current_file = None
-            with self.data_lock:
-                if processed_index < len(self.files):
-                    current_file = self.files[processed_index]
-                    processed_index += 1
-                else:
+            current_file = self._pick_next_job(budget, job_threads)
+
+            if not current_file:
+                if self.stop_requested:
                     break
-            
-            if current_file:
-                file_size = 0
-                try: file_size = os.path.getsize(current_file)
-                except: pass
+                # 切片队列已空，但仍有视频在上传时继续等待，期间新添加的文件也能被处理
+                if any(t.is_alive() for t in job_threads):
+                    time.sleep(SCRATCH_POLL_SECONDS)
+                    continue
+                break
 
-                base_name = os.path.splitext(os.path.basename(current_file))[0]
+            file_size = self.job_sizes.get(current_file, 0)
+            base_name = os.path.splitext(os.path.basename(current_file))[0]
+
+            with self.data_lock:
+                video_dir = self.job_dirs.get(current_file)
+
+            if video_dir:
+                # 暂停前已切片完成，直接继续上传剩余分片
+                self.log(f"{base_name} 继续上传剩余分片")
+            else:
                 self._update_status(current_file, "⚡ 切片中")
                 self._focus_row(current_file)
-                
-                self.current_processing_bytes = 0 
-                
-                ok = self._process_single(current_file, base_name, seg, thr, retries, file_size)
-                
+
+                video_dir, interrupted = self._slice_single(current_file, base_name, seg)
+
                 if self.stop_requested:
                     self._update_status(current_file, "⛔ 已停止")
                     break
 
-                if ok:
-                    self._update_status(current_file, "✅ 完成")
-                
-                with self.data_lock:
-                    self.finished_file_bytes += file_size
-                    self.current_processing_bytes = 0 
-                    self._calculate_and_update_global_progress()
+                if not video_dir:
+                    if interrupted:
+                        self._settle_interrupted(current_file, file_size)
+                    else:
+                        self._finish_job(current_file, file_size)
+                    continue
+
+            t = threading.Thread(target=self._upload_single,
+                                 args=(current_file, base_name, video_dir, retries, file_size), daemon=True)
+            t.start()
+            job_threads.append(t)
+
+        for t in job_threads:
+            t.join()
+        self._stop_upload_workers()
 
         if self.stop_requested:
             self.log("任务已强制停止！", "WARN")
@@ -535,17 +780,245 @@ class VideoUploaderGUI:
                 for fname, count in self.failed_summary.items():
                     self.log(f"   -> 视频: {fname} | 失败分片数: {count}", "ERR")
                 self.log("提示：失败的视频已保留切片目录，请检查。", "WARN")
-            else:
+            if self.space_skipped:
+                self.log(f"⚠️ 注意：有 {len(self.space_skipped)} 个视频因临时空间不足被跳过", "WARN")
+                for fname in self.space_skipped:
+                    self.log(f"   -> 视频: {fname}", "ERR")
+            if not self.failed_summary and not self.space_skipped:
                 self.log("所有视频完美通过！")
                 try:
                     if os.path.exists(OUTPUT_DIR) and not os.listdir(OUTPUT_DIR):
                         shutil.rmtree(OUTPUT_DIR)
                 except: pass
+        paused = [fp for fp, state in self.job_state.items() if state == JOB_PAUSED]
+        if paused:
+            self.log(f"提示：有 {len(paused)} 个任务处于暂停状态，右键继续后重新开始处理即可接着执行", "WARN")
+        self.log(f"本次在途切片空间峰值 (与临时空间上限同口径): {self.scratch_peak_bytes/1024/1024/1024:.2f} GB")
         
         self.is_running = False
         self.stop_requested = False
         self.root.after(0, self._reset_btn)
 
+    def _pending_jobs(self):
+        """按 优先级 -> 调度策略 -> 列表顺序 排好的待处理视频，调用方需持有 data_lock"""
+        policy = self.schedule_policy
+        pending = [(i, fp) for i, fp in enumerate(self.files)
+                   if fp not in self.started_files and fp not in self.active_jobs and fp not in self.job_state]
+
+        def _key(item):
+            i, fp = item
+            level = self.job_priority.get(fp, PRIORITY_NORMAL)
+            size = self.job_sizes.get(fp, 0)
+            if policy == POLICY_SMALLEST:
+                return (level, size, i)
+            if policy == POLICY_LARGEST:
+                return (level, -size, i)
+            return (level, i)
+
+        return [fp for _, fp in sorted(pending, key=_key)]
+
+    def _pick_next_job(self, budget, job_threads):
+        """选出下一个可以开始的视频。预计占用 (约等于源文件大小) 加上在途切片目录超出上限，
+        或磁盘剩余空间不足时推迟启动；推迟期间每次轮询都重新排序，
+        后加入的紧急任务、同优先级里放得下的小文件可以先开始，不会被大文件堵住。"""
+        waiting_for = None
+        while not self.stop_requested:
+            with self.data_lock:
+                pending = self._pending_jobs()
+            if not pending:
+                return None
+
+            top = pending[0]
+            level = self.job_priority.get(top, PRIORITY_NORMAL)
+            in_flight = self._in_flight_bytes()
+            self._note_scratch_usage(in_flight)
+            free = shutil.disk_usage(OUTPUT_DIR).free
+
+            def _within_budget(fp):
+                # 上限约束的是并发占用，没有在途目录时不管文件多大都可以开始
+                return budget <= 0 or in_flight == 0 or in_flight + self.job_sizes.get(fp, 0) <= budget
+
+            def _disk_fits(fp):
+                return self.job_sizes.get(fp, 0) + SCRATCH_RESERVE_BYTES <= free
+
+            def _fits(fp):
+                # 暂停前已切片完成的视频不再需要新空间
+                if fp in self.job_dirs:
+                    return True
+                return _within_budget(fp) and _disk_fits(fp)
+
+            # 只在最高的优先级内挑，低优先级的小文件不能插队把腾出的空间一直占着
+            chosen = None
+            for fp in pending:
+                if self.job_priority.get(fp, PRIORITY_NORMAL) != level:
+                    break
+                if _fits(fp):
+                    chosen = fp
+                    break
+
+            jobs_alive = any(t.is_alive() for t in job_threads)
+            if not chosen and not jobs_alive and _disk_fits(top):
+                # 在途的只剩暂停任务保留的目录，等待不会释放空间；磁盘放得下就超出上限单独处理
+                self.log(f"{os.path.basename(top)} 超出临时空间上限，当前没有其他任务在处理，单独处理", "WARN")
+                chosen = top
+
+            if chosen:
+                with self.data_lock:
+                    # 轮询期间可能被暂停/取消或删除
+                    if chosen in self.job_state or chosen in self.started_files or chosen not in self.files:
+                        continue
+                    self.started_files.add(chosen)
+                    self.active_jobs.add(chosen)
+                if waiting_for == chosen:
+                    self.log(f"{os.path.basename(chosen)} 临时空间已满足，开始处理")
+                elif waiting_for:
+                    self.log(f"{os.path.basename(chosen)} 先行处理，{os.path.basename(waiting_for)} 继续等待临时空间")
+                return chosen
+
+            base = os.path.splitext(os.path.basename(top))[0]
+            need_bytes = self.job_sizes.get(top, 0)
+            if not jobs_alive:
+                # 没有正在上传的视频可以释放空间，磁盘本身放不下，继续等待也无济于事
+                self.log(f"{base} 磁盘剩余空间不足，已跳过 (需要 {need_bytes/1024/1024/1024:.2f} GB，"
+                         f"在途 {in_flight/1024/1024/1024:.2f} GB，剩余 {free/1024/1024/1024:.2f} GB)", "ERR")
+                with self.data_lock:
+                    self.started_files.add(top)
+                self.space_skipped.append(base)
+                self._update_status(top, "❌ 空间不足")
+                self._finish_job(top, need_bytes)
+                continue
+
+            if waiting_for != top:
+                self.log(f"{base} 临时空间不足，等待在途切片上传释放空间...", "WARN")
+                self._update_status(top, "⏳ 等待空间")
+                waiting_for = top
+            time.sleep(SCRATCH_POLL_SECONDS)
+        return None
+
+    def _start_upload_workers(self, thr):
+        self.seg_pending = {}
+        self.upload_closed = False
+        self.upload_workers = [threading.Thread(target=self._upload_worker, daemon=True) for _ in range(thr)]
+        for w in self.upload_workers:
+            w.start()
+
+    def _stop_upload_workers(self):
+        self._withdraw_segments()
+        with self.seg_cond:
+            self.upload_closed = True
+            self.seg_cond.notify_all()
+        for w in self.upload_workers:
+            w.join()
+        self.upload_workers = []
+
+    def _submit_segment(self, fp, fn, seg_path):
+        fut = Future()
+        with self.seg_cond:
+            self.seg_pending.setdefault(fp, deque()).append((fut, fn, seg_path))
+            self.seg_cond.notify()
+        return fut
+
+    def _withdraw_segments(self, fp=None):
+        """撤回排队中还未开始上传的分片，fp 为空时撤回全部"""
+        with self.seg_cond:
+            keys = list(self.seg_pending) if fp is None else [fp]
+            for key in keys:
+                for fut, _, _ in self.seg_pending.pop(key, ()):
+                    # 只有 set_running_or_notify_cancel 会唤醒 as_completed，单独 cancel 会让上传线程一直等下去
+                    fut.cancel()
+                    fut.set_running_or_notify_cancel()
+
+    def _next_segment(self):
+        with self.seg_cond:
+            while True:
+                if self.seg_pending:
+                    # 每个空闲线程都重新挑选：紧急视频一有分片排队，就按分片粒度抢占后台视频的上传线程；
+                    # 同优先级保持提交顺序，先开始上传的视频先传完
+                    fp = min(self.seg_pending, key=lambda p: self.job_priority.get(p, PRIORITY_NORMAL))
+                    tasks = self.seg_pending[fp]
+                    task = tasks.popleft()
+                    if not tasks:
+                        del self.seg_pending[fp]
+                    return task
+                if self.upload_closed:
+                    return None
+                self.seg_cond.wait()
+
+    def _upload_worker(self):
+        while True:
+            task = self._next_segment()
+            if task is None:
+                return
+            fut, fn, seg_path = task
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(seg_path))
+            except Exception as e:
+                fut.set_exception(e)
+
+    def _finish_job(self, fp, file_size):
+        with self.data_lock:
+            self.finished_file_bytes += file_size
+            self.job_progress_bytes.pop(fp, None)
+            self.active_jobs.discard(fp)
+            self._calculate_and_update_global_progress()
+
+    def _park_job(self, fp):
+        # 放回待处理队列并交出所有权，保留切片目录和已上传地址；暂停期间已被继续的任务此后才会被重新调度
+        with self.data_lock:
+            self.started_files.discard(fp)
+            self.active_jobs.discard(fp)
+            self.job_progress_bytes.pop(fp, None)
+            self._calculate_and_update_global_progress()
+            still_paused = self.job_state.get(fp) == JOB_PAUSED
+        self._update_status(fp, "⏸ 已暂停" if still_paused else "等待继续")
+
+    def _settle_interrupted(self, fp, file_size):
+        """切片被暂停/取消中断后收尾：取消的清理并计入进度，其余放回队列 (中断后已被继续的会重新切片)"""
+        if self.job_state.get(fp) == JOB_CANCELLED:
+            self._discard_job_files(fp)
+            self._update_status(fp, "🚫 已取消")
+            self._finish_job(fp, file_size)
+        else:
+            self._park_job(fp)
+
+    def _note_scratch_usage(self, used_bytes):
+        with self.data_lock:
+            if used_bytes > self.scratch_peak_bytes:
+                self.scratch_peak_bytes = used_bytes
+
+    def _in_flight_bytes(self):
+        # 只统计正在切片/上传以及暂停中保留的目录，历史失败目录不占用预算
+        with self.data_lock:
+            dirs = list(self.active_dirs)
+        return sum(dir_size(d) for d in dirs)
+
+    def _purge_stale_slices(self):
+        """清理超过保留期的失败切片目录，避免它们长期占用磁盘"""
+        if FAILED_RETENTION_DAYS <= 0:
+            return
+        cutoff = time.time() - FAILED_RETENTION_DAYS * 24 * 3600
+        with self.data_lock:
+            keep = set(self.active_dirs)
+        removed = 0
+        freed = 0
+        for name in os.listdir(OUTPUT_DIR):
+            path = os.path.join(OUTPUT_DIR, name)
+            if path in keep or not os.path.isdir(path):
+                continue
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                size = dir_size(path)
+                shutil.rmtree(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+        if removed:
+            self.log(f"已清理 {removed} 个超过 {FAILED_RETENTION_DAYS} 天的失败切片目录，释放 {freed/1024/1024/1024:.2f} GB", "WARN")
+
     def _reset_btn(self):
         self.start_btn.config(state="normal", bg=COLOR_BTN_START)
         self.stop_btn.config(state="disabled", bg="#ff9999", text="停止任务")
@@ -555,17 +1028,33 @@ class VideoUploaderGUI:
 
     def _tree_set(self, fp, status):
         for iid in self.tree.get_children():
-            if self.tree.item(iid, "values")[1] == fp:
-                self.tree.item(iid, values=(os.path.basename(fp), fp, status))
+            if self.tree.set(iid, "path") == fp:
+                self.tree.set(iid, "status", status)
 
     def _focus_row(self, fp):
         for iid in self.tree.get_children():
-            if self.tree.item(iid, "values")[1] == fp:
+            if self.tree.set(iid, "path") == fp:
                 self.root.after(0, lambda: self.tree.see(iid))
                 self.root.after(0, lambda: self.tree.selection_set(iid))
 
-    def _process_single(self, input_file, base, seg, thr, max_retries, file_total_size):
+    def _alloc_video_dir(self, base):
+        # 上一个同名视频可能还在上传，切片目录不能共用
         video_dir = os.path.join(OUTPUT_DIR, base)
+        with self.data_lock:
+            n = 1
+            while video_dir in self.active_dirs:
+                video_dir = os.path.join(OUTPUT_DIR, f"{base}_{n}")
+                n += 1
+            self.active_dirs.add(video_dir)
+        return video_dir
+
+    def _release_video_dir(self, video_dir):
+        with self.data_lock:
+            self.active_dirs.discard(video_dir)
+
+    def _slice_single(self, input_file, base, seg):
+        """返回 (切片目录, 是否被中断)，失败或中断时目录为 None"""
+        video_dir = self._alloc_video_dir(base)
         os.makedirs(video_dir, exist_ok=True)
         
         cmd = ["ffmpeg", "-y", "-i", input_file, "-c", "copy", "-map", "0", "-f", "segment", "-segment_time", str(seg), "-segment_list", os.path.join(video_dir, f"{base}.m3u8"), os.path.join(video_dir, "%03d.ts")]
@@ -576,85 +1065,171 @@ class VideoUploaderGUI:
             if os.name == 'nt':
                 startupinfo = subprocess.STARTUPINFO()
                 startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo)
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, startupinfo=startupinfo)
         except Exception as e:
             self.log(f"{base} 切片失败: {e}", "ERR")
-            return False
-        
-        self.log(f"{base} 切片完成")
+            self._release_video_dir(video_dir)
+            return None, False
 
-        if self.stop_requested:
-            self.log(f"{base} 停止请求生效，正在清理切片...", "WARN")
+        # 登记后暂停/取消/停止可随时 terminate；登记前就已收到的请求在这里补上
+        with self.data_lock:
+            self.job_procs[input_file] = proc
+        if self.stop_requested or input_file in self.job_state:
+            self._interrupt_job(input_file)
+        # 切片期间其他视频仍在边传边删，按间隔采样才能记到真实的空间峰值
+        while True:
+            try:
+                _, err = proc.communicate(timeout=SCRATCH_POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                self._note_scratch_usage(self._in_flight_bytes())
+        with self.data_lock:
+            # 登记已被 _interrupt_job 取走说明是被中断的，即使暂停标记此刻已被继续清除
+            interrupted = self.job_procs.pop(input_file, None) is not proc
+
+        if interrupted or self.stop_requested:
+            # 被中断的 ffmpeg 留下的是半截切片，无法接着切，清理后下次从头切片
+            self.log(f"{base} 切片已中断，正在清理未完成的切片...", "WARN")
             try: shutil.rmtree(video_dir)
             except: pass
-            return False
+            self._release_video_dir(video_dir)
+            return None, True
+
+        if proc.returncode != 0:
+            detail = err.decode("utf-8", errors="ignore").strip().splitlines()[-1:] if err else []
+            self.log(f"{base} 切片失败: ffmpeg 返回 {proc.returncode} {' '.join(detail)}", "ERR")
+            self._release_video_dir(video_dir)
+            return None, False
+        
+        self.log(f"{base} 切片完成")
+        # 切片刚完成时该视频的分片全部在盘，是临时空间占用的高点
+        self._note_scratch_usage(self._in_flight_bytes())
+
+        with self.data_lock:
+            self.job_dirs[input_file] = video_dir
+        return video_dir, False
+
+    def _upload_single(self, input_file, base, video_dir, max_retries, file_total_size):
+        ok = self._upload_segments(input_file, base, video_dir, max_retries, file_total_size)
+        state = self.job_state.get(input_file)
+
+        # 只有被中断 (ok 为 None) 才走暂停/停止/取消；已经传完或部分失败的任务照常收尾
+        if ok is None:
+            if state == JOB_PAUSED:
+                self.log(f"{base} 已暂停，已上传的分片会保留", "WARN")
+                self._park_job(input_file)
+            elif self.stop_requested:
+                self.log(f"{base} 任务已终止，正在清理残留文件...", "WARN")
+                self._discard_job_files(input_file)
+                self._update_status(input_file, "⛔ 已停止")
+            elif state == JOB_CANCELLED:
+                self.log(f"{base} 已取消，正在清理残留文件...", "WARN")
+                self._discard_job_files(input_file)
+                self._update_status(input_file, "🚫 已取消")
+                self._finish_job(input_file, file_total_size)
+            else:
+                # 暂停/取消后在收尾期间又被继续
+                self._park_job(input_file)
+            return
 
+        with self.data_lock:
+            self.job_dirs.pop(input_file, None)
+            self.job_urls.pop(input_file, None)
+            # 排空期间收到的暂停/取消已无意义，不清掉的话下一轮会被漏掉
+            self.job_state.pop(input_file, None)
+        self._release_video_dir(video_dir)
+        if ok:
+            self._update_status(input_file, "✅ 完成")
+        self._finish_job(input_file, file_total_size)
+
+    def _upload_segments(self, input_file, base, video_dir, max_retries, file_total_size):
+        """上传目录中剩余的分片；返回 True 全部成功，False 有分片失败，None 被暂停/取消/停止"""
+        # 上传成功的分片已被删除，目录里剩下的就是还没传的
         ts_files = sorted([f for f in os.listdir(video_dir) if f.endswith(".ts")], 
                           key=lambda x: int(os.path.splitext(x)[0]))
+        with self.data_lock:
+            urls = self.job_urls.setdefault(input_file, {})
         
-        if not ts_files: return False
-        
-        self.log(f"{base} 开始上传")
-        self._update_status(input_file, "☁ 已上传 0%")
-        urls = {}
+        if not ts_files and not urls: return False
         
-        total_ts = len(ts_files)
-        uploaded_ts_count = 0
+        total_ts = len(urls) + len(ts_files)
+        uploaded_ts_count = len(urls)
         failed_segments = 0
         lock = threading.Lock()
 
+        if urls:
+            self.log(f"{base} 继续上传 (已完成 {uploaded_ts_count}/{total_ts})")
+        else:
+            self.log(f"{base} 开始上传")
+        self._update_status(input_file, f"☁ 已上传 {int(uploaded_ts_count / total_ts * 100)}%")
+
+        def _interrupted():
+            return self.stop_requested or input_file in self.job_state
+
         def _u(fpath):
             fname = os.path.basename(fpath)
             for i in range(1, max_retries + 1):
-                if self.stop_requested:
+                if _interrupted():
                     raise Exception("Task Stopped")
 
                 try:
-                    return upload_file(fpath)
+                    url = upload_file(fpath)
                 except Exception as e:
-                    if self.stop_requested: raise Exception("Task Stopped")
+                    if _interrupted(): raise Exception("Task Stopped")
                     if i < max_retries:
                         self.log(f"⚠️ {fname} 上传失败，正在重试 ({i}/{max_retries})...", "WARN")
                         time.sleep(i)
+                        continue
                     else:
                         raise e
+                # 上传成功立即删除分片，尽早释放临时空间
+                try: os.remove(fpath)
+                except OSError: pass
+                return url
+
+        futs = {self._submit_segment(input_file, _u, os.path.join(video_dir, f)): f for f in ts_files}
+        interrupted = False
+        for f in as_completed(futs):
+            if _interrupted():
+                interrupted = True
+                break
 
-        with ThreadPoolExecutor(thr) as pool:
-            futs = {pool.submit(_u, os.path.join(video_dir, f)): f for f in ts_files}
-            for f in as_completed(futs):
-                if self.stop_requested:
-                    for pending_f in futs:
-                        pending_f.cancel()
-                    break
-
-                name = futs[f]
-                try:
-                    url = f.result()
-                    urls[name] = url
-                    
-                    with lock:
-                        uploaded_ts_count += 1
-                        file_ratio = uploaded_ts_count / total_ts
-                        with self.data_lock:
-                            self.current_processing_bytes = file_total_size * file_ratio
-                            self._calculate_and_update_global_progress()
-                        
-                        percent_str = int(file_ratio * 100)
-                        self._update_status(input_file, f"☁ 已上传 {percent_str}%")
+            name = futs[f]
+            try:
+                url = f.result()
+                urls[name] = url
+                
+                with lock:
+                    uploaded_ts_count += 1
+                    file_ratio = uploaded_ts_count / total_ts
+                    with self.data_lock:
+                        self.job_progress_bytes[input_file] = file_total_size * file_ratio
+                        self._calculate_and_update_global_progress()
                     
-                    self.log(f"{name} 上传成功")
-                except Exception as e:
-                    if "Task Stopped" in str(e): 
-                        break
-                    self.log(f"❌ {name} 最终上传失败: {e}", "ERR")
-                    with lock:
-                        failed_segments += 1
+                    percent_str = int(file_ratio * 100)
+                    self._update_status(input_file, f"☁ 已上传 {percent_str}%")
+                
+                self.log(f"{name} 上传成功")
+            except CancelledError:
+                interrupted = True
+                break
+            except Exception as e:
+                if "Task Stopped" in str(e): 
+                    interrupted = True
+                    break
+                self.log(f"❌ {name} 最终上传失败: {e}", "ERR")
+                with lock:
+                    failed_segments += 1
         
-        if self.stop_requested:
-            self.log(f"{base} 任务已终止，正在清理残留文件...", "WARN")
-            try: shutil.rmtree(video_dir)
-            except: pass
-            return False
+        if interrupted:
+            self._withdraw_segments(input_file)
+            # 等正在上传的分片跑完：成功的分片已从磁盘删除，必须记下地址才能在继续时拼出 m3u8
+            for f, name in futs.items():
+                if f.cancelled():
+                    continue
+                try: urls[name] = f.result()
+                except Exception: pass
+            return None
 
         self.log(f"{base} 上传完成")
 
@@ -670,20 +1245,9 @@ class VideoUploaderGUI:
         except Exception as e:
             self.log(f"{base} 写入M3U8失败: {e}", "ERR")
 
-        # 【核心修复】部分失败时，只删除成功的 ts 文件，保留失败的 ts 和 m3u8
+        # 成功的 ts 在上传后已删除，目录中只剩失败的 ts 和 m3u8
         if failed_segments > 0:
-            self.log(f"{base} 上传完成，但有 {failed_segments} 个切片失败。", "WARN")
-            
-            deleted_success_count = 0
-            for ts_name in urls.keys(): # urls里是成功的
-                ts_full_path = os.path.join(video_dir, ts_name)
-                try:
-                    if os.path.exists(ts_full_path):
-                        os.remove(ts_full_path)
-                        deleted_success_count += 1
-                except: pass
-            
-            self.log(f"{base} 已清理 {deleted_success_count} 个成功切片，保留失败切片。", "WARN")
+            self.log(f"{base} 上传完成，但有 {failed_segments} 个切片失败，已保留失败切片。", "WARN")
 
             self.failed_summary[base] = failed_segments
             self._update_status(input_file, f"{failed_segments}个ts上传失败")